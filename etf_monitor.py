@@ -0,0 +1,444 @@
+"""主動式 ETF 持股監控
+
+每日抓取各檔 ETF 的持股明細, 與前一日比較後產生異動報告 (GitHub Pages)。
+"""
+
+import asyncio
+import glob
+import heapq
+import html
+import os
+import re
+import httpx
+import msgspec
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from datetime import datetime
+
+OUTPUT_DIR = 'etf_data'
+
+# 解析失敗時是否保存網頁 (批次環境下佔 artifact 空間, 預設關閉)
+DEBUG = os.environ.get('ETF_MONITOR_DEBUG') == '1'
+
+# 各 URL 上次回應的 ETag / Last-Modified, 供條件式請求使用
+_HTTP_CACHE_FILE = os.path.join(OUTPUT_DIR, '.http_cache.json')
+
+# compare_holdings 實際用到的欄位與型別; amount 比較時用不到, 不必解析
+_PREV_COLS = ['ETF', 'stock_id', 'stock_name', 'shares', 'weight']
+_PREV_DTYPES = {'ETF': 'category', 'stock_id': 'category',
+                'stock_name': 'category', 'shares': 'float64',
+                'weight': 'float64'}
+
+_URL_MAP = {
+    '00981A': 'https://www.ezmoney.com.tw/ETF/Fund/Inv/00981A',
+}
+
+# 直接比對 bytes, 省去為整個網頁先做一次 UTF-8 解碼
+_DATA_CONTENT_RE = re.compile(rb'id="DataAsset"[^>]*data-content="([^"]+)"')
+
+
+# DataAsset 的型別描述: msgspec 依此直接解進固定欄位的 C struct,
+# 不經過中間 dict, 之後以屬性存取取代逐鍵 hash 查找
+class _Detail(msgspec.Struct):
+    DetailCode: str = ''
+    DetailName: str = ''
+    Share: float = 0.0
+    NavRate: float = 0.0
+    Amount: float = 0.0
+
+
+class _Asset(msgspec.Struct):
+    AssetCode: str = ''
+    Details: list[_Detail] = []
+
+
+def _load_http_cache():
+    """讀取上次保存的 ETag/Last-Modified"""
+    try:
+        with open(_HTTP_CACHE_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def _save_http_cache(cache):
+    with open(_HTTP_CACHE_FILE, 'wb') as f:
+        f.write(orjson.dumps(cache))
+
+
+def _load_latest_holdings(etf_code):
+    """上游回 304 未變時, 改讀最近一份 parquet 快取"""
+    latest = heapq.nlargest(
+        1, glob.iglob(os.path.join(OUTPUT_DIR, 'etf_holdings_*.parquet')))
+    if not latest:
+        return None
+    df = pd.read_parquet(latest[0])
+    df = df[df['ETF'] == etf_code].reset_index(drop=True)
+    if df.empty:
+        return None
+    df['ETF'] = pd.Categorical([etf_code] * len(df), categories=[etf_code])
+    return df
+
+
+class ETFScraper:
+    """ETF 持股爬蟲基底類別"""
+
+    def __init__(self):
+        self.headers = {
+            'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                           'AppleWebKit/537.36 (KHTML, like Gecko) '
+                           'Chrome/120.0.0.0 Safari/537.36'),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+        }
+
+    def save_debug_html(self, etf_code, content):
+        """ETF_MONITOR_DEBUG=1 時保存原始網頁 bytes 以便除錯"""
+        if not DEBUG:
+            return
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        debug_file = os.path.join(OUTPUT_DIR, f'debug_{etf_code}_{timestamp}.html')
+        with open(debug_file, 'wb') as f:
+            f.write(content)
+        print(f'  已保存除錯網頁: {debug_file}')
+
+
+class UnifiedScraper(ETFScraper):
+    """統一投信 ETF 爬蟲 (ezmoney)"""
+
+    async def fetch_holdings_async(self, client, etf_code, http_cache=None):
+        """抓取持股明細, 回傳 DataFrame (stock_id, stock_name, shares, weight, amount)"""
+        url = _URL_MAP.get(etf_code)
+        if not url:
+            print(f'  未知的 ETF 代碼: {etf_code}')
+            return None
+
+        # 帶上前次的 ETag/Last-Modified, 內容未變時上游只回 304 不傳網頁
+        headers = dict(self.headers)
+        cached = (http_cache or {}).get(url, {})
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304:
+                print(f'  {etf_code} 內容未變 (304), 沿用前次持股')
+                return _load_latest_holdings(etf_code)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f'  請求失敗: {e}')
+            return None
+
+        if http_cache is not None:
+            entry = {}
+            if response.headers.get('ETag'):
+                entry['etag'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                entry['last_modified'] = response.headers['Last-Modified']
+            if entry:
+                http_cache[url] = entry
+
+        # 解析丟到執行緒, 讓多檔回應的解析互相重疊, 也不卡住事件迴圈
+        return await asyncio.to_thread(self._parse_holdings, etf_code, response.content)
+
+    def _parse_holdings(self, etf_code, page_bytes):
+        """從網頁內容解析持股明細"""
+        # 持股明細放在 DataAsset 區塊的 data-content 屬性 (JSON);
+        # 直接用 regex 取出該屬性, 免去為了一個欄位建整棵 DOM
+        m = _DATA_CONTENT_RE.search(page_bytes)
+        if not m:
+            print('  找不到 DataAsset 區塊')
+            self.save_debug_html(etf_code, page_bytes)
+            return None
+
+        json_str = html.unescape(m.group(1).decode('utf-8'))
+
+        try:
+            assets = msgspec.json.decode(json_str.encode(), type=list[_Asset])
+        except msgspec.DecodeError as e:
+            print(f'  JSON 解析失敗: {e}')
+            self.save_debug_html(etf_code, page_bytes)
+            return None
+
+        # 只留股票部位; 結構外的欄位在解碼時即被略過, 非 ST 分支不佔成本
+        details = [d for a in assets if a.AssetCode == 'ST' for d in a.Details]
+
+        if not details:
+            print('  無股票持股資料')
+            self.save_debug_html(etf_code, page_bytes)
+            return None
+
+        # 逐欄建表, 避免先建一列一 dict 再讓 pandas 重新拆解
+        n = len(details)
+        df = pd.DataFrame({
+            'stock_id': [d.DetailCode.strip() for d in details],
+            'stock_name': [d.DetailName.strip() for d in details],
+            'shares': np.fromiter((d.Share for d in details),
+                                  dtype=np.float64, count=n),
+            'weight': np.fromiter((d.NavRate for d in details),
+                                  dtype=np.float64, count=n),
+            'amount': np.fromiter((d.Amount for d in details),
+                                  dtype=np.float64, count=n),
+        })
+        # category 只存整數編碼 + 去重字典, 比 object 字串省記憶體,
+        # 後續 merge/groupby 也只比整數而非重複 hash 字串
+        df['ETF'] = pd.Categorical([etf_code] * n, categories=[etf_code])
+        return df.astype({'stock_id': 'category', 'stock_name': 'category'})
+
+
+def compare_holdings(df_curr, df_prev):
+    """比較當日與前日持股, 回傳 {ETF: {'new':..., 'exit':..., 'changed':...}}"""
+    # merge 鍵是 categorical 時, 兩邊類別需一致編碼才會對齊; 先取聯集統一
+    for col in ('ETF', 'stock_id'):
+        curr_cat = df_curr[col].astype('category')
+        prev_cat = df_prev[col].astype('category')
+        union = curr_cat.cat.categories.union(prev_cat.cat.categories)
+        df_curr[col] = curr_cat.cat.set_categories(union)
+        df_prev[col] = prev_cat.cat.set_categories(union)
+
+    # 單一 outer merge (C 層 hash join) 同時標出新增 (left_only)、
+    # 剔除 (right_only) 與共同持股, 取代逐 ETF 的 set_index/difference/intersection
+    merged = df_curr.merge(df_prev, on=['ETF', 'stock_id'], how='outer',
+                           suffixes=('_curr', '_prev'), indicator=True)
+
+    # 差異欄直接算在 merged 上 (單邊持股得 NaN, 被 _merge 條件排除),
+    # 省掉先切出共同持股再 .copy() 一份的整段緩衝複製
+    merged['weight_diff'] = merged['weight_curr'] - merged['weight_prev']
+    merged['shares_diff'] = merged['shares_curr'] - merged['shares_prev']
+    changed_all = merged[(merged['_merge'] == 'both') &
+                         ((merged['weight_diff'].abs() > 0.001) |
+                          (merged['shares_diff'] != 0))]
+
+    changes = {}
+    for etf in df_curr['ETF'].unique():
+        in_etf = merged['ETF'] == etf
+        new_df = (merged.loc[in_etf & (merged['_merge'] == 'left_only'),
+                             ['stock_id', 'stock_name_curr', 'shares_curr', 'weight_curr']]
+                  .rename(columns={'stock_name_curr': 'stock_name',
+                                   'shares_curr': 'shares',
+                                   'weight_curr': 'weight'})
+                  .set_index('stock_id'))
+        exit_df = (merged.loc[in_etf & (merged['_merge'] == 'right_only'),
+                              ['stock_id', 'stock_name_prev', 'shares_prev', 'weight_prev']]
+                   .rename(columns={'stock_name_prev': 'stock_name',
+                                    'shares_prev': 'shares',
+                                    'weight_prev': 'weight'})
+                   .set_index('stock_id'))
+        changed_df = (changed_all.loc[changed_all['ETF'] == etf,
+                                      ['stock_id', 'stock_name_curr',
+                                       'shares_prev', 'shares_curr', 'shares_diff',
+                                       'weight_prev', 'weight_curr', 'weight_diff']]
+                      .rename(columns={'stock_name_curr': 'stock_name'}))
+
+        if len(new_df) > 0 or len(exit_df) > 0 or len(changed_df) > 0:
+            changes[etf] = {'new': new_df, 'exit': exit_df, 'changed': changed_df}
+
+    return changes
+
+
+def _write_if_changed(path, content):
+    """內容未變就不重寫; 有變則先寫暫存檔再 os.replace, 讀者不會看到半份檔案"""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _holdings_table(df):
+    """持股表格交給 to_html 的 C 層 formatter 輸出"""
+    out = df.reset_index()[['stock_id', 'stock_name', 'shares', 'weight']]
+    out.columns = ['代碼', '名稱', '股數', '權重']
+    return out.to_html(index=False, escape=False, border=0,
+                       formatters={'股數': lambda x: f'{int(x):,}',
+                                   '權重': lambda x: f'{x}%'})
+
+
+def generate_html_report(changes, date_str):
+    """產生持股異動 HTML 報告"""
+    header = f'''<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>ETF 持股異動報告 {date_str}</title>
+<style>
+body {{ font-family: "Microsoft JhengHei", sans-serif; margin: 20px; background: #f5f5f5; }}
+h1 {{ color: #333; }}
+h2 {{ color: #0066cc; border-bottom: 2px solid #0066cc; padding-bottom: 5px; }}
+table {{ border-collapse: collapse; width: 100%; background: #fff; margin-bottom: 20px; }}
+th, td {{ border: 1px solid #ddd; padding: 8px; text-align: right; }}
+th {{ background: #0066cc; color: #fff; }}
+td:first-child, td:nth-child(2) {{ text-align: left; }}
+.increase {{ color: #c00; }}
+.decrease {{ color: #090; }}
+</style>
+</head>
+<body>
+<h1>ETF 持股異動報告 {date_str}</h1>
+'''
+
+    # 片段收集到 list 最後一次 join, 避免對越長越慢的字串反覆 +=
+    parts = [header]
+    for etf, data in changes.items():
+        parts.append(f'<h2>{etf}</h2>\n')
+
+        if len(data['new']) > 0:
+            parts.append('<h3>新增持股</h3>\n')
+            parts.append(_holdings_table(data['new']))
+            parts.append('\n')
+
+        if len(data['exit']) > 0:
+            parts.append('<h3>剔除持股</h3>\n')
+            parts.append(_holdings_table(data['exit']))
+            parts.append('\n')
+
+        if len(data['changed']) > 0:
+            parts.append('<h3>持股異動</h3>\n<table>\n')
+            parts.append('<tr><th>代碼</th><th>名稱</th><th>前日股數</th><th>當日股數</th>'
+                         '<th>股數增減</th><th>權重增減</th></tr>\n')
+            # 先整欄向量化格式化, 迴圈內不再逐格呼叫 int()/f-string
+            d = data['changed']
+            render = pd.DataFrame({
+                'stock_id': d['stock_id'].astype(str),
+                'stock_name': d['stock_name'].astype(str),
+                'shares_prev': d['shares_prev'].astype(np.int64).map('{:,}'.format),
+                'shares_curr': d['shares_curr'].astype(np.int64).map('{:,}'.format),
+                's_color': np.where(d['shares_diff'] > 0, 'increase',
+                                    np.where(d['shares_diff'] < 0, 'decrease', '')),
+                's_diff': d['shares_diff'].astype(np.int64).map('{:+,}'.format),
+                'w_color': np.where(d['weight_diff'] > 0, 'increase',
+                                    np.where(d['weight_diff'] < 0, 'decrease', '')),
+                'w_diff': d['weight_diff'].map('{:+.2f}%'.format),
+            })
+            row_tpl = ('<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td>'
+                       '<td class="{}">{}</td><td class="{}">{}</td></tr>\n')
+            parts.extend(row_tpl.format(*t)
+                         for t in render.itertuples(index=False, name=None))
+            parts.append('</table>\n')
+
+    parts.append(f'<p>產生時間: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>\n')
+    parts.append('</body>\n</html>\n')
+    html_content = ''.join(parts)
+
+    report_file = f'report_{date_str}.html'
+    _write_if_changed(report_file, html_content)
+    print(f'已產生報告: {report_file}')
+
+
+def generate_index_page(latest_date):
+    """產生 index.html 導向最新報告"""
+    html_content = f'''<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="0; url=report_{latest_date}.html">
+<title>ETF 持股異動報告</title>
+</head>
+<body>
+<p>導向最新報告中... <a href="report_{latest_date}.html">report_{latest_date}.html</a></p>
+</body>
+</html>
+'''
+    if _write_if_changed('index.html', html_content):
+        print('已更新 index.html')
+
+
+async def _fetch_all_holdings(target_etfs):
+    """以共用 AsyncClient 並行抓取所有 ETF 持股"""
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+    sem = asyncio.Semaphore(5)
+    http_cache = _load_http_cache()
+
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=15) as client:
+
+        async def run(etf):
+            async with sem:
+                print(f'抓取 {etf["code"]} {etf["name"]}...')
+                return await etf['scraper'].fetch_holdings_async(
+                    client, etf['code'], http_cache)
+
+        results = await asyncio.gather(*(run(etf) for etf in target_etfs))
+
+    _save_http_cache(http_cache)
+    return results
+
+
+def monitor_etfs():
+    """主流程: 抓取 -> 存檔 -> 與前日比較 -> 產生報告"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    target_etfs = [
+        {'code': '00981A', 'name': '主動統一台股增長', 'scraper': UnifiedScraper()},
+    ]
+
+    # 各 ETF 的抓取純粹是等網路, 並行後總時間約等於最慢一檔而非全部加總
+    results = asyncio.run(_fetch_all_holdings(target_etfs))
+
+    all_data = []
+    for etf, df in zip(target_etfs, results):
+        if df is not None and not df.empty:
+            print(f'  {etf["code"]} 取得 {len(df)} 檔持股')
+            all_data.append(df)
+
+    if not all_data:
+        print('未取得任何持股資料')
+        return
+
+    # 單一 ETF 時不必 concat; 多檔時不複製緩衝並直接給乾淨的整數索引
+    # (ETF 欄已在爬蟲端產生, 不再事後補欄)
+    final_df = (all_data[0] if len(all_data) == 1
+                else pd.concat(all_data, copy=False, ignore_index=True))
+
+    timestamp = datetime.now().strftime('%Y%m%d')
+    filename = os.path.join(OUTPUT_DIR, f'etf_holdings_{timestamp}.csv')
+    # pyarrow 的多執行緒 C writer 逐欄序列化, 不走 to_csv 的逐列 Python formatter;
+    # 先寫 BOM 讓 Excel 認得 UTF-8 (等同原本的 utf-8-sig)
+    with open(filename, 'wb') as f:
+        f.write(b'\xef\xbb\xbf')
+        pacsv.write_csv(pa.Table.from_pandas(final_df, preserve_index=False), f,
+                        write_options=pacsv.WriteOptions(include_header=True))
+    # 另存 parquet 快取: 帶型別的欄式格式, 隔日比較時載入不必重跑 CSV 解析
+    final_df.to_parquet(os.path.join(OUTPUT_DIR, f'etf_holdings_{timestamp}.parquet'))
+    print(f'已儲存: {filename}')
+
+    # 檔名含日期、字典序即時間序; nlargest 邊掃邊淘汰, 只留最新兩個,
+    # 歷史檔累積多年也不用整串排序
+    top2 = heapq.nlargest(
+        2, glob.iglob(os.path.join(OUTPUT_DIR, 'etf_holdings_*.csv')))
+    if len(top2) >= 2:
+        prev_file = top2[1]
+        print(f'與前次資料比較: {os.path.basename(prev_file)}')
+        prev_parquet = prev_file.replace('.csv', '.parquet')
+        if os.path.exists(prev_parquet):
+            df_prev = pd.read_parquet(prev_parquet, columns=_PREV_COLS)
+        else:
+            # 舊檔沒有 parquet 快取時退回 CSV; 給定欄位與型別,
+            # 既省逐欄推斷也跳過用不到的欄位
+            df_prev = pd.read_csv(prev_file, usecols=_PREV_COLS,
+                                  dtype=_PREV_DTYPES)
+        changes = compare_holdings(final_df, df_prev)
+        if changes:
+            generate_html_report(changes, timestamp)
+        else:
+            print('持股無異動')
+
+    generate_index_page(timestamp)
+
+
+if __name__ == '__main__':
+    monitor_etfs()